@@ -1,3 +1,4 @@
 from .layout import spaCyLayout
+from .util import use_arrow_tables
 
-__all__ = ["spaCyLayout"]
+__all__ = ["spaCyLayout", "use_arrow_tables"]
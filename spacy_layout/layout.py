@@ -1,3 +1,7 @@
+import multiprocessing
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from typing import (
@@ -11,15 +15,31 @@ from typing import (
     overload,
 )
 
+import pypdfium2
 import srsly
 from docling.datamodel.base_models import DocumentStream
+from docling.datamodel.settings import DEFAULT_PAGE_RANGE, PageRange
 from docling.document_converter import DocumentConverter
-from docling_core.types.doc.document import DoclingDocument
+from docling_core.types.doc.document import DoclingDocument, TableItem, TextItem
 from docling_core.types.doc.labels import DocItemLabel
+from spacy.attrs import ORTH, SPACY
 from spacy.tokens import Doc, Span, SpanGroup
 
-from .types import Attrs, DocLayout, DoclingItem, PageLayout, SpanLayout
-from .util import decode_df, decode_obj, encode_df, encode_obj, get_bounding_box
+from .types import (
+    Attrs,
+    DocLayout,
+    DoclingItem,
+    PageLayout,
+    SpanLayout,
+)
+
+# get_bounding_box isn't used here, but it's importable from this module
+from .util import (
+    decode_types,
+    encode_types,
+    get_bounding_box,
+    get_bounding_boxes,
+)
 
 if TYPE_CHECKING:
     from docling.datamodel.base_models import InputFormat
@@ -31,13 +51,14 @@ if TYPE_CHECKING:
 _AnyContext = TypeVar("_AnyContext")
 
 TABLE_PLACEHOLDER = "TABLE"
-TABLE_ITEM_LABELS = [DocItemLabel.TABLE, DocItemLabel.DOCUMENT_INDEX]
+TABLE_ITEM_LABELS = frozenset({DocItemLabel.TABLE, DocItemLabel.DOCUMENT_INDEX})
+
+# Register msgpack encoder and decoder for custom types
+srsly.msgpack_encoders.register("spacy-layout", func=encode_types)
+srsly.msgpack_decoders.register("spacy-layout", func=decode_types)
 
-# Register msgpack encoders and decoders for custom types
-srsly.msgpack_encoders.register("spacy-layout.dataclass", func=encode_obj)
-srsly.msgpack_decoders.register("spacy-layout.dataclass", func=decode_obj)
-srsly.msgpack_encoders.register("spacy-layout.dataframe", func=encode_df)
-srsly.msgpack_decoders.register("spacy-layout.dataframe", func=decode_df)
+# Document converter of a worker process, see spaCyLayout.pipe
+_worker_converter: DocumentConverter | None = None
 
 
 class spaCyLayout:
@@ -56,6 +77,7 @@ class spaCyLayout:
     ) -> None:
         """Initialize the layout parser and Docling converter."""
         self.nlp = nlp
+        self._tokenizer = nlp.tokenizer
         self.sep = separator
         self.attrs = Attrs(
             doc_layout=attrs.get("doc_layout", "layout"),
@@ -67,8 +89,9 @@ class spaCyLayout:
             span_data=attrs.get("span_data", "data"),
             span_group=attrs.get("span_group", "layout"),
         )
-        self.headings = headings
+        self.headings = frozenset(headings)
         self.display_table = display_table
+        self.docling_options = docling_options
         self.converter = DocumentConverter(format_options=docling_options)
         # Set spaCy extension attributes for custom data
         Doc.set_extension(self.attrs.doc_layout, default=None, force=True)
@@ -79,10 +102,14 @@ class spaCyLayout:
         Span.set_extension(self.attrs.span_data, default=None, force=True)
         Span.set_extension(self.attrs.span_heading, getter=self.get_heading, force=True)
 
-    def __call__(self, source: str | Path | bytes | DoclingDocument) -> Doc:
+    def __call__(
+        self, source: str | Path | bytes | DoclingDocument, split_pages: int = 0
+    ) -> Doc:
         """Call parser on a path to create a spaCy Doc object."""
         if isinstance(source, DoclingDocument):
             result = source
+        elif split_pages > 0 and self._is_pdf(source):
+            result = self._convert_split(source, split_pages)
         else:
             result = self.converter.convert(self._get_source(source)).document
         return self._result_to_doc(result)
@@ -92,6 +119,7 @@ class spaCyLayout:
         self,
         sources: Iterable[str | Path | bytes],
         as_tuples: Literal[False] = ...,
+        n_process: int = ...,
     ) -> Iterator[Doc]: ...
 
     @overload
@@ -99,6 +127,7 @@ class spaCyLayout:
         self,
         sources: Iterable[tuple[str | Path | bytes, _AnyContext]],
         as_tuples: Literal[True] = ...,
+        n_process: int = ...,
     ) -> Iterator[tuple[Doc, _AnyContext]]: ...
 
     def pipe(
@@ -108,21 +137,88 @@ class spaCyLayout:
             | Iterable[tuple[str | Path | bytes, _AnyContext]]
         ),
         as_tuples: bool = False,
+        n_process: int = 1,
     ) -> Iterator[Doc] | Iterator[tuple[Doc, _AnyContext]]:
         """Process multiple documents and create spaCy Doc objects."""
         if as_tuples:
             sources = cast(Iterable[tuple[str | Path | bytes, _AnyContext]], sources)
             data = (self._get_source(source) for source, _ in sources)
             contexts = (context for _, context in sources)
-            results = self.converter.convert_all(data)
+            results = self._convert_all(data, n_process)
             for result, context in zip(results, contexts):
-                yield (self._result_to_doc(result.document), context)
+                yield (self._result_to_doc(result), context)
         else:
             sources = cast(Iterable[str | Path | bytes], sources)
             data = (self._get_source(source) for source in sources)
-            results = self.converter.convert_all(data)
+            results = self._convert_all(data, n_process)
             for result in results:
-                yield self._result_to_doc(result.document)
+                yield self._result_to_doc(result)
+
+    def _convert_all(
+        self, sources: Iterable[str | Path | DocumentStream], n_process: int
+    ) -> Iterator[DoclingDocument]:
+        """Convert documents with Docling, optionally in multiple processes.
+        Each worker process creates its own converter, and results are yielded
+        in the order of the sources.
+        """
+        if n_process == -1:
+            n_process = multiprocessing.cpu_count()
+        if n_process == 1:
+            for result in self.converter.convert_all(sources):
+                yield result.document
+        else:
+            # Don't fork the process, since it may be multi-threaded, e.g. if
+            # models were loaded with torch, which can cause deadlocks
+            with ProcessPoolExecutor(
+                max_workers=n_process,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.docling_options,),
+            ) as executor:
+                # Only read and submit a limited number of sources ahead of
+                # the results, so the documents are still streamed
+                futures = deque()
+                for source in sources:
+                    futures.append(executor.submit(_convert, source))
+                    if len(futures) >= n_process * 2:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+
+    def _convert_split(
+        self, source: str | Path | bytes, split_pages: int
+    ) -> DoclingDocument:
+        """Convert a PDF in chunks of split_pages pages in parallel processes
+        and merge the results. Page numbers are preserved because each chunk
+        is converted from the full document with a page range.
+        """
+        pdf = pypdfium2.PdfDocument(source)
+        n_pages = len(pdf)
+        pdf.close()
+        page_ranges = [
+            (start, min(start + split_pages - 1, n_pages))
+            for start in range(1, n_pages + 1, split_pages)
+        ]
+        if len(page_ranges) <= 1:
+            return self.converter.convert(self._get_source(source)).document
+        sources = [self._get_source(source) for _ in page_ranges]
+        with ProcessPoolExecutor(
+            max_workers=min(len(page_ranges), multiprocessing.cpu_count()),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.docling_options,),
+        ) as executor:
+            documents = list(executor.map(_convert, sources, page_ranges))
+        return DoclingDocument.concatenate(documents)
+
+    def _is_pdf(self, source: str | Path | bytes) -> bool:
+        """Check if a source is PDF data or a local PDF file, which can be
+        split. Other inputs like URLs are converted as a whole by Docling.
+        """
+        if isinstance(source, bytes):
+            return source.startswith(b"%PDF")
+        path = Path(source)
+        return path.suffix.lower() == ".pdf" and path.is_file()
 
     def _get_source(self, source: str | Path | bytes) -> str | Path | DocumentStream:
         if isinstance(source, (str, Path)):
@@ -131,101 +227,186 @@ class spaCyLayout:
 
     def _result_to_doc(self, document: DoclingDocument) -> Doc:
         inputs = []
-        pages = {
-            (page.page_no): PageLayout(
+        # Export each table to a DataFrame only once, so it can be used for
+        # the table text and the span data
+        table_data = {}
+        # Page numbers are dense, so we can look up pages by index
+        pages: list[PageLayout | None] = [None] * (max(document.pages, default=0) + 1)
+        for page in document.pages.values():
+            pages[page.page_no] = PageLayout(
                 page_no=page.page_no,
                 width=page.size.width if page.size else 0,
                 height=page.size.height if page.size else 0,
             )
-            for _, page in document.pages.items()
-        }
-        text_items = {item.self_ref: item for item in document.texts}
-        table_items = {item.self_ref: item for item in document.tables}
         # We want to iterate over the tree to get different elements in order
-        for node, _ in document.iterate_items():
-            if node.self_ref in text_items:
-                item = text_items[node.self_ref]
+        for item, _ in document.iterate_items():
+            if isinstance(item, TextItem):
                 if item.text == "":
                     continue
                 inputs.append((item.text, item))
-            elif node.self_ref in table_items:
-                item = table_items[node.self_ref]
+            elif isinstance(item, TableItem):
+                df = item.export_to_dataframe()
+                table_data[item.self_ref] = df
                 if isinstance(self.display_table, str):
                     table_text = self.display_table
                 else:
-                    table_text = self.display_table(item.export_to_dataframe())
+                    table_text = self.display_table(df)
                 inputs.append((table_text, item))
-        doc = self._texts_to_doc(inputs, pages)
-        doc._.set(self.attrs.doc_layout, DocLayout(pages=[p for p in pages.values()]))
+        doc = self._texts_to_doc(inputs, pages, table_data)
+        doc_layout = DocLayout(pages=[p for p in pages if p is not None])
+        doc._.set(self.attrs.doc_layout, doc_layout)
         doc._.set(self.attrs.doc_markdown, document.export_to_markdown())
         return doc
 
     def _texts_to_doc(
-        self, inputs: list[tuple[str, DoclingItem]], pages: dict[int, PageLayout]
+        self,
+        inputs: list[tuple[str, DoclingItem]],
+        pages: list[PageLayout | None],
+        table_data: dict[str, "DataFrame"],
     ) -> Doc:
         """Convert Docling structure to spaCy Doc."""
-        words = []
-        spaces = []
-        span_data = []
-        token_idx = 0
-        # Tokenize the span because we can't rely on the document parsing to
-        # give us items that are not split across token boundaries
-        with self.nlp.select_pipes(disable=self.nlp.pipe_names):
-            for span_doc, item in self.nlp.pipe(inputs, as_tuples=True):
-                words += [token.text for token in span_doc]
-                spaces += [bool(token.whitespace_) for token in span_doc]
-                # Add separator token and don't include it in the layout span
-                if self.sep:
-                    words.append(self.sep)
-                    spaces[-1] = False
-                    spaces.append(False)
-                end = token_idx + len(span_doc)
-                span_data.append((item, token_idx, end))
-                token_idx += len(span_doc) + (1 if self.sep else 0)
-        doc = Doc(self.nlp.vocab, words=words, spaces=spaces)
+        # Token offsets of the items are stored as separate arrays of starts and
+        # ends, in the same order as the inputs
+        doc, starts, ends = self._tokenize_text(inputs)
+        if doc is None:
+            doc, starts, ends = self._tokenize_items(inputs)
+        items = [item for _, item in inputs]
+        layouts = self._get_span_layouts(items, pages)
         spans = []
-        for i, (item, start, end) in enumerate(span_data):
-            span = Span(doc, start=start, end=end, label=item.label, span_id=i)
-            layout = self._get_span_layout(item, pages)
-            span._.set(self.attrs.span_layout, layout)
+        for i, item in enumerate(items):
+            span = Span(doc, start=starts[i], end=ends[i], label=item.label, span_id=i)
+            span._.set(self.attrs.span_layout, layouts[i])
             if item.label in TABLE_ITEM_LABELS:
-                span._.set(self.attrs.span_data, item.export_to_dataframe())
+                span._.set(self.attrs.span_data, table_data[item.self_ref])
             spans.append(span)
         doc.spans[self.attrs.span_group] = SpanGroup(
             doc, name=self.attrs.span_group, spans=spans
         )
         return doc
 
-    def _get_span_layout(
-        self, item: DoclingItem, pages: dict[int, PageLayout]
-    ) -> SpanLayout | None:
-        if item.prov:
-            prov = item.prov[0]
-            page = pages[prov.page_no]
-            if page.width and page.height:
-                x, y, width, height = get_bounding_box(prov.bbox, page.height)
-                return SpanLayout(
-                    x=x, y=y, width=width, height=height, page_no=prov.page_no
-                )
+    def _tokenize_text(
+        self, inputs: list[tuple[str, DoclingItem]]
+    ) -> tuple[Doc | None, array, array]:
+        """Tokenize the full text at once and map the items to token offsets.
+        Returns None for the Doc if an item doesn't start or end on a token
+        boundary or a separator isn't a single token of its own. Only
+        whitespace separators are tokenized like this, since other separators
+        can change how the text of the items is split, e.g. by being treated
+        as a suffix. Without a separator, the tokenizer would merge most
+        items, so None is returned without tokenizing.
+        """
+        starts = array("i")
+        ends = array("i")
+        sep = self.sep
+        # Empty items (e.g. tables displayed as an empty string) would merge
+        # the separators around them
+        if not sep or not sep.isspace() or any(not text for text, _ in inputs):
+            return None, starts, ends
+        parts = []
+        start_chars = array("i")
+        char_idx = 0
+        for item_text, _ in inputs:
+            parts.append(item_text)
+            parts.append(sep)
+            start_chars.append(char_idx)
+            char_idx += len(item_text) + len(sep)
+        doc = self._tokenizer("".join(parts))
+        for start_char, (item_text, _) in zip(start_chars, inputs):
+            end_char = start_char + len(item_text)
+            span = doc.char_span(start_char, end_char)
+            sep_span = doc.char_span(end_char, end_char + len(sep))
+            if span is None or sep_span is None or len(sep_span) != 1:
+                return None, starts, ends
+            starts.append(span.start)
+            ends.append(span.end)
+        return doc, starts, ends
+
+    def _tokenize_items(
+        self, inputs: list[tuple[str, DoclingItem]]
+    ) -> tuple[Doc, array, array]:
+        """Tokenize each item separately and construct the Doc from the words.
+        Slower than tokenizing the full text, but guarantees that items are
+        not split across token boundaries.
+        """
+        words = []
+        spaces = []
+        starts = array("i")
+        ends = array("i")
+        token_idx = 0
+        strings = self.nlp.vocab.strings
+        texts = [item_text for item_text, _ in inputs]
+        # Custom tokenizers can be any callable and don't need to have a pipe
+        tokenizer_pipe = getattr(self._tokenizer, "pipe", None)
+        if tokenizer_pipe is not None:
+            span_docs = tokenizer_pipe(texts)
+        else:
+            span_docs = (self._tokenizer(text) for text in texts)
+        for span_doc in span_docs:
+            # Read the token texts and whitespace in bulk instead of
+            # accessing the attributes on each Token object
+            orths, token_spaces = span_doc.to_array([ORTH, SPACY]).T.tolist()
+            words += [strings[orth] for orth in orths]
+            spaces += [bool(space) for space in token_spaces]
+            # Add separator token and don't include it in the layout span. The
+            # item can be empty if a table is displayed as an empty string.
+            if self.sep:
+                if spaces:
+                    spaces[-1] = False
+                words.append(self.sep)
+                spaces.append(False)
+            starts.append(token_idx)
+            ends.append(token_idx + len(span_doc))
+            token_idx += len(span_doc) + (1 if self.sep else 0)
+        doc = Doc(self.nlp.vocab, words=words, spaces=spaces)
+        return doc, starts, ends
+
+    def _get_span_layouts(
+        self, items: list[DoclingItem], pages: list[PageLayout | None]
+    ) -> list[SpanLayout | None]:
+        """Get the layouts of all items, computing the bounding boxes at once."""
+        layouts: list[SpanLayout | None] = [None] * len(items)
+        provs = {}
+        page_heights = []
+        for i, item in enumerate(items):
+            if item.prov:
+                prov = item.prov[0]
+                page = cast(PageLayout, pages[prov.page_no])
+                if page.width and page.height:
+                    provs[i] = prov
+                    page_heights.append(page.height)
+        if not provs:
+            return layouts
+        bboxes = [prov.bbox for prov in provs.values()]
+        left, y, width, height = get_bounding_boxes(bboxes, page_heights).T
+        rows = zip(left.tolist(), y.tolist(), width.tolist(), height.tolist())
+        for (i, prov), (x, y, width, height) in zip(provs.items(), rows):
+            layouts[i] = SpanLayout(
+                x=x, y=y, width=width, height=height, page_no=prov.page_no
+            )
+        return layouts
 
     def get_pages(self, doc: Doc) -> list[tuple[PageLayout, list[Span]]]:
         """Get all pages and their layout spans."""
         layout = doc._.get(self.attrs.doc_layout)
-        pages = {page.page_no: page for page in layout.pages}
-        page_spans = {page.page_no: [] for page in layout.pages}
+        # Group the spans by page in one pass. Spans without layout aren't
+        # on any page.
+        page_spans = defaultdict(list)
         for span in doc.spans[self.attrs.span_group]:
             span_layout = span._.get(self.attrs.span_layout)
-            page_spans[span_layout.page_no].append(span)
-        return [(pages[i], page_spans[i]) for i in page_spans]
+            if span_layout is not None:
+                page_spans[span_layout.page_no].append(span)
+        return [(page, page_spans[page.page_no]) for page in layout.pages]
 
     def get_heading(self, span: Span) -> Span | None:
         """Get the closest heading for a span."""
-        spans = list(span.doc.spans[self.attrs.span_group])
-        if span.label_ not in self.headings:
-            # Go through previous layout spans in reverse and find first match
-            for candidate in spans[: span.id][::-1]:
-                if candidate.label_ in self.headings:
-                    return candidate
+        if span.label_ in self.headings:
+            return None
+        spans = span.doc.spans[self.attrs.span_group]
+        # Go through previous layout spans in reverse and find first match,
+        # without copying the span group
+        for i in range(min(span.id, len(spans)) - 1, -1, -1):
+            if spans[i].label_ in self.headings:
+                return spans[i]
 
     def get_tables(self, doc: Doc) -> list[Span]:
         """Get all tables in the document."""
@@ -234,3 +415,17 @@ class spaCyLayout:
             for span in doc.spans[self.attrs.span_group]
             if span.label_ in TABLE_ITEM_LABELS
         ]
+
+
+def _init_worker(docling_options: dict["InputFormat", "FormatOption"] | None) -> None:
+    """Create the document converter of a worker process."""
+    global _worker_converter
+    _worker_converter = DocumentConverter(format_options=docling_options)
+
+
+def _convert(
+    source: str | Path | DocumentStream, page_range: PageRange = DEFAULT_PAGE_RANGE
+) -> DoclingDocument:
+    """Convert a document in a worker process."""
+    converter = cast(DocumentConverter, _worker_converter)
+    return converter.convert(source, page_range=page_range).document
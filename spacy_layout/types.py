@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Sequence
 
 from docling_core.types.doc.document import (
     ListItem,
@@ -10,7 +11,7 @@ from docling_core.types.doc.document import (
 DoclingItem = ListItem | SectionHeaderItem | TextItem | TableItem
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Attrs:
     """Custom atributes used to extend spaCy"""
 
@@ -24,7 +25,7 @@ class Attrs:
     span_group: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PageLayout:
     page_no: int
     width: float
@@ -32,10 +33,17 @@ class PageLayout:
 
     @classmethod
     def from_dict(cls, data: dict) -> "PageLayout":
-        return cls(**data)
+        return cls(data["page_no"], data["width"], data["height"])
+
+    @classmethod
+    def from_data(cls, data: Sequence) -> "PageLayout":
+        return cls(*data)
+
+    def to_data(self) -> list:
+        return [self.page_no, self.width, self.height]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DocLayout:
     """Document layout features added to Doc object"""
 
@@ -46,8 +54,16 @@ class DocLayout:
         pages = [PageLayout.from_dict(page) for page in data.get("pages", [])]
         return cls(pages=pages)
 
+    @classmethod
+    def from_data(cls, data: Sequence) -> "DocLayout":
+        (pages,) = data
+        return cls(pages=list(pages))
+
+    def to_data(self) -> list:
+        return [self.pages]
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class SpanLayout:
     """Text span layout features added to Span object"""
 
@@ -59,4 +75,11 @@ class SpanLayout:
 
     @classmethod
     def from_dict(cls, data: dict) -> "SpanLayout":
-        return cls(**data)
+        return cls(data["x"], data["y"], data["width"], data["height"], data["page_no"])
+
+    @classmethod
+    def from_data(cls, data: Sequence) -> "SpanLayout":
+        return cls(*data)
+
+    def to_data(self) -> list:
+        return [self.x, self.y, self.width, self.height, self.page_no]
@@ -1,54 +1,160 @@
-import dataclasses
-from typing import TYPE_CHECKING, Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Sequence
 
+import numpy
 from docling_core.types.doc.base import CoordOrigin
-from pandas import DataFrame
+from pandas import DataFrame, Index, RangeIndex
 
 from .types import DocLayout, PageLayout, SpanLayout
 
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
 if TYPE_CHECKING:
     from docling_core.types.doc.base import BoundingBox
 
 TYPE_ATTR = "__type__"
+DATA_ATTR = "data"
+INDEX_ATTR = "index"
 OBJ_TYPES = {"SpanLayout": SpanLayout, "DocLayout": DocLayout, "PageLayout": PageLayout}
+# Serialized names of the classes, looked up by exact type
+OBJ_NAMES = {obj_cls: name for name, obj_cls in OBJ_TYPES.items()}
+# Whether to serialize table data in the Arrow format, see use_arrow_tables
+_use_arrow = False
 
 
-def encode_obj(obj: Any, chain: Callable | None = None) -> Any:
-    """Convert custom dataclass to dict for serialization."""
-    if isinstance(obj, tuple(OBJ_TYPES.values())):
-        result = dataclasses.asdict(obj)
-        result[TYPE_ATTR] = type(obj).__name__
-        return result
-    return obj if chain is None else chain(obj)
+def use_arrow_tables(enable: bool = True) -> None:
+    """Serialize table data in the compact Arrow (Feather) format, which is
+    faster for larger tables. Requires pyarrow, and loading the serialized
+    data requires it as well.
+    """
+    global _use_arrow
+    if enable and pyarrow is None:
+        raise ImportError(
+            "Storing tables in the Arrow format requires pyarrow. "
+            "Install spacy-layout[arrow] or pyarrow to use it."
+        )
+    _use_arrow = enable
 
 
-def decode_obj(obj: Any, chain: Callable | None = None) -> Any:
-    """Load custom dataclass from serialized dict."""
-    if isinstance(obj, dict) and obj.get(TYPE_ATTR) in OBJ_TYPES:
-        obj_type = obj.pop(TYPE_ATTR)
-        return OBJ_TYPES[obj_type].from_dict(obj)
-    return obj if chain is None else chain(obj)
+def encode_df(df: DataFrame) -> dict:
+    """Convert pandas.DataFrame for serialization. If enabled via
+    use_arrow_tables, the data is stored in the Arrow IPC (Feather) format.
+    Otherwise, or if Arrow can't represent the data exactly, it's stored as a
+    list of values per column, plus the index if it's not the default. Like
+    DataFrame.to_dict, only the last of multiple columns with the same name is
+    kept.
+    """
+    # Arrow converts column names to strings
+    if _use_arrow and all(isinstance(col, str) for col in df.columns):
+        try:
+            return {DATA_ATTR: encode_feather(df), TYPE_ATTR: "DataFrame"}
+        except (pyarrow.ArrowException, ValueError):
+            # E.g. duplicate column names or columns of mixed types
+            pass
+    data = {col: df.iloc[:, i].tolist() for i, col in enumerate(df.columns)}
+    result = {DATA_ATTR: data, TYPE_ATTR: "DataFrame"}
+    # The default index is created again when loading the data
+    if not is_default_index(df.index):
+        result[INDEX_ATTR] = df.index.tolist()
+    return result
+
+
+def is_default_index(index: Index) -> bool:
+    """Check if an index is the RangeIndex pandas creates by default."""
+    return (
+        isinstance(index, RangeIndex)
+        and index.start == 0
+        and index.step == 1
+        and index.name is None
+    )
+
+
+def decode_df(obj: dict) -> DataFrame:
+    """Load pandas.DataFrame from serialized data."""
+    if isinstance(obj[DATA_ATTR], bytes):
+        return decode_feather(obj[DATA_ATTR])
+    # DataFrames serialized with older versions store a dict per column
+    # that maps index to value, so there's no separate index
+    return DataFrame(obj[DATA_ATTR], index=obj.get(INDEX_ATTR))
 
 
-def encode_df(obj: Any, chain: Callable | None = None) -> Any:
-    """Convert pandas.DataFrame for serialization."""
+def encode_types(obj: Any, chain: Callable | None = None) -> Any:
+    """Convert all custom types for serialization. Registered as a single
+    encoder, so objects of other types don't pass through one chained
+    function call per type. The field values of the dataclasses are stored
+    positionally, so the field names aren't repeated for every object. Nested
+    dataclasses are encoded separately by msgpack.
+    """
+    obj_type = OBJ_NAMES.get(type(obj))
+    if obj_type is not None:
+        return {TYPE_ATTR: obj_type, DATA_ATTR: obj.to_data()}
     if isinstance(obj, DataFrame):
-        return {"data": obj.to_dict(), TYPE_ATTR: "DataFrame"}
+        return encode_df(obj)
     return obj if chain is None else chain(obj)
 
 
-def decode_df(obj: Any, chain: Callable | None = None) -> Any:
-    """Load pandas.DataFrame from serialized data."""
-    if isinstance(obj, dict) and obj.get(TYPE_ATTR) == "DataFrame":
-        return DataFrame(obj["data"])
+def decode_types(obj: Any, chain: Callable | None = None) -> Any:
+    """Load all custom types from serialized dicts."""
+    if isinstance(obj, dict):
+        obj_type = obj.get(TYPE_ATTR)
+        obj_cls = OBJ_TYPES.get(obj_type)
+        if obj_cls is not None:
+            if DATA_ATTR in obj:
+                return obj_cls.from_data(obj[DATA_ATTR])
+            # Objects serialized with older versions store the fields as dict
+            return obj_cls.from_dict(obj)
+        if obj_type == "DataFrame":
+            return decode_df(obj)
     return obj if chain is None else chain(obj)
 
 
+def encode_feather(df: DataFrame) -> bytes:
+    """Write a DataFrame to uncompressed Feather bytes."""
+    sink = pyarrow.BufferOutputStream()
+    pyarrow.feather.write_feather(df, sink, compression="uncompressed")
+    return sink.getvalue().to_pybytes()
+
+
+def decode_feather(data: bytes) -> DataFrame:
+    """Read a DataFrame from Feather bytes."""
+    if pyarrow is None:
+        raise ImportError(
+            "The serialized data includes tables stored in the Arrow format. "
+            "Install spacy-layout[arrow] or pyarrow to load them."
+        )
+    return pyarrow.feather.read_feather(pyarrow.BufferReader(data))
+
+
 def get_bounding_box(
     bbox: "BoundingBox", page_height: float
 ) -> tuple[float, float, float, float]:
-    is_bottom = bbox.coord_origin == CoordOrigin.BOTTOMLEFT
-    y = page_height - bbox.t if is_bottom else bbox.t
-    height = bbox.t - bbox.b if is_bottom else bbox.b - bbox.t
-    width = bbox.r - bbox.l
-    return (bbox.l, y, width, height)
+    # Read the attributes of the pydantic model only once
+    left, top, right, bottom = bbox.l, bbox.t, bbox.r, bbox.b
+    if bbox.coord_origin == CoordOrigin.BOTTOMLEFT:
+        return (left, page_height - top, right - left, top - bottom)
+    return (left, top, right - left, bottom - top)
+
+
+def get_bounding_boxes(
+    bboxes: Sequence["BoundingBox"], page_heights: Sequence[float]
+) -> numpy.ndarray:
+    """Convert bounding boxes to (x, y, width, height) with a top-left origin.
+    Returns an array of shape (n, 4) with one row per bounding box.
+    """
+    n = len(bboxes)
+    left = numpy.fromiter((bbox.l for bbox in bboxes), dtype=numpy.float64, count=n)
+    top = numpy.fromiter((bbox.t for bbox in bboxes), dtype=numpy.float64, count=n)
+    right = numpy.fromiter((bbox.r for bbox in bboxes), dtype=numpy.float64, count=n)
+    bottom = numpy.fromiter((bbox.b for bbox in bboxes), dtype=numpy.float64, count=n)
+    is_bottom = numpy.fromiter(
+        (bbox.coord_origin == CoordOrigin.BOTTOMLEFT for bbox in bboxes),
+        dtype=bool,
+        count=n,
+    )
+    heights = numpy.asarray(page_heights, dtype=numpy.float64)
+    y = numpy.where(is_bottom, heights - top, top)
+    height = numpy.where(is_bottom, top - bottom, bottom - top)
+    return numpy.stack([left, y, right - left, height], axis=1)
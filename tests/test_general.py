@@ -4,15 +4,17 @@ import pytest
 import spacy
 import srsly
 from docling_core.types.doc.base import BoundingBox, CoordOrigin
+from docling_core.types.doc.document import DoclingDocument
 from docling_core.types.doc.labels import DocItemLabel
 from pandas import DataFrame
 from pandas.testing import assert_frame_equal
-from spacy.tokens import DocBin
+from spacy.tokens import Doc, DocBin, Span
 import pandas as pd
 
-from spacy_layout import spaCyLayout
+from spacy_layout import spaCyLayout, use_arrow_tables
 from spacy_layout.layout import TABLE_PLACEHOLDER, get_bounding_box
 from spacy_layout.types import DocLayout, PageLayout, SpanLayout
+from spacy_layout.util import DATA_ATTR, encode_df, get_bounding_boxes
 
 PDF_STARCRAFT = Path(__file__).parent / "data" / "starcraft.pdf"
 PDF_SIMPLE = Path(__file__).parent / "data" / "simple.pdf"
@@ -58,6 +60,72 @@ def test_pages(path, pg_no, nlp):
         assert len(result[0][1]) == 4
 
 
+def test_pages_span_group_changed(nlp):
+    layout = spaCyLayout(nlp)
+    doc = layout(PDF_SIMPLE)
+    spans = list(doc.spans[layout.attrs.span_group])
+    assert len(layout.get_pages(doc)[0][1]) == 4
+    doc.spans[layout.attrs.span_group] = spans[:2]
+    result = layout.get_pages(doc)
+    assert len(result) == 1
+    assert result[0][1] == spans[:2]
+
+
+def test_split_pages(nlp):
+    layout = spaCyLayout(nlp)
+    doc = layout(PDF_STARCRAFT)
+    split_doc = layout(PDF_STARCRAFT, split_pages=2)
+    pages = doc._.get(layout.attrs.doc_layout).pages
+    split_pages = split_doc._.get(layout.attrs.doc_layout).pages
+    assert [page.page_no for page in split_pages] == [page.page_no for page in pages]
+    assert len(layout.get_pages(split_doc)) == 6
+    assert split_doc.text == doc.text
+    spans = doc.spans[layout.attrs.span_group]
+    split_spans = split_doc.spans[layout.attrs.span_group]
+    assert [span.label_ for span in split_spans] == [span.label_ for span in spans]
+    for span in split_spans:
+        assert isinstance(span._.get(layout.attrs.span_layout), SpanLayout)
+
+
+def test_split_pages_url(nlp):
+    layout = spaCyLayout(nlp)
+    # URLs are converted by Docling as a whole and not split
+    assert not layout._is_pdf("https://arxiv.org/pdf/2408.09869.pdf")
+    assert layout._is_pdf(PDF_STARCRAFT)
+    assert layout._is_pdf(str(PDF_STARCRAFT))
+    assert layout._is_pdf(PDF_SIMPLE_BYTES)
+
+
+def test_heading(nlp):
+    layout = spaCyLayout(nlp)
+    doc = layout(PDF_STARCRAFT)
+    spans = list(doc.spans[layout.attrs.span_group])
+    for span in spans:
+        heading = span._.get(layout.attrs.span_heading)
+        if span.label_ in layout.headings:
+            assert heading is None
+            continue
+        # The heading should be the closest preceding heading span
+        previous = [s for s in spans[: span.id] if s.label_ in layout.headings]
+        expected = previous[-1] if previous else None
+        assert heading == expected
+
+
+def test_heading_span_group_changed(nlp):
+    layout = spaCyLayout(nlp)
+    doc = layout(DOCX_SIMPLE)
+    spans = list(doc.spans[layout.attrs.span_group])
+    assert spans[1]._.get(layout.attrs.span_heading) is None
+    header_label = DocItemLabel.SECTION_HEADER
+    header = Span(doc, spans[0].start, spans[0].end, label=header_label, span_id=0)
+    text = Span(doc, spans[1].start, spans[1].end, label=spans[1].label, span_id=1)
+    doc.spans[layout.attrs.span_group] = [header, text]
+    new_spans = doc.spans[layout.attrs.span_group]
+    assert new_spans[0]._.get(layout.attrs.span_heading) is None
+    assert new_spans[1]._.get(layout.attrs.span_heading) == new_spans[0]
+    assert spans[3]._.get(layout.attrs.span_heading) == new_spans[0]
+
+
 @pytest.mark.parametrize("path", [PDF_SIMPLE, DOCX_SIMPLE])
 @pytest.mark.parametrize("separator", ["\n\n", ""])
 def test_simple(path, separator, nlp):
@@ -68,6 +136,45 @@ def test_simple(path, separator, nlp):
     assert doc.spans[layout.attrs.span_group][0].text == "Lorem ipsum dolor sit amet"
 
 
+def test_separator_whitespace(nlp):
+    layout = spaCyLayout(nlp, separator=" ")
+    doc = layout(DOCX_SIMPLE)
+    spans = doc.spans[layout.attrs.span_group]
+    assert len(spans) == 4
+    # Each span should be followed by its own separator token
+    for span in spans:
+        assert doc[span.end].text == " "
+
+
+@pytest.mark.parametrize("separator", ["---", "|"])
+def test_separator_punctuation(separator, nlp):
+    document = DoclingDocument(name="test")
+    document.add_text(label=DocItemLabel.TEXT, text="3.5-")
+    layout = spaCyLayout(nlp, separator=separator)
+    doc = layout(document)
+    # The separator shouldn't change how the text of the item is tokenized
+    assert [token.text for token in doc] == ["3.5-", separator]
+    assert doc.spans[layout.attrs.span_group][0].text == "3.5-"
+
+
+@pytest.mark.parametrize("separator", ["\n\n", ""])
+def test_custom_tokenizer(separator, nlp):
+    class WhitespaceTokenizer:
+        def __init__(self, vocab):
+            self.vocab = vocab
+
+        def __call__(self, text):
+            words = text.split(" ")
+            spaces = [True] * (len(words) - 1) + [False]
+            return Doc(self.vocab, words=words, spaces=spaces)
+
+    nlp.tokenizer = WhitespaceTokenizer(nlp.vocab)
+    layout = spaCyLayout(nlp, separator=separator)
+    doc = layout(DOCX_SIMPLE)
+    assert len(doc.spans[layout.attrs.span_group]) == 4
+    assert doc.spans[layout.attrs.span_group][0].text == "Lorem ipsum dolor sit amet"
+
+
 def test_simple_pipe(nlp):
     layout = spaCyLayout(nlp)
     for doc in layout.pipe([PDF_SIMPLE, DOCX_SIMPLE]):
@@ -83,6 +190,37 @@ def test_simple_pipe_as_tuples(nlp):
     assert [context for _, context in result] == ["pdf", "docx"]
 
 
+@pytest.mark.parametrize("as_tuples", [False, True])
+def test_simple_pipe_n_process(as_tuples, nlp):
+    layout = spaCyLayout(nlp)
+    paths = [DOCX_SIMPLE, DOCX_SIMPLE]
+    data = [(path, i) for i, path in enumerate(paths)] if as_tuples else paths
+    result = list(layout.pipe(data, as_tuples=as_tuples, n_process=2))
+    assert len(result) == 2
+    for i, item in enumerate(result):
+        doc = item[0] if as_tuples else item
+        assert len(doc.spans[layout.attrs.span_group]) == 4
+        if as_tuples:
+            assert item[1] == i
+
+
+def test_simple_pipe_n_process_streams(nlp):
+    layout = spaCyLayout(nlp)
+    consumed = []
+
+    def get_sources():
+        for i in range(10):
+            consumed.append(i)
+            yield DOCX_SIMPLE
+
+    docs = layout.pipe(get_sources(), n_process=2)
+    doc = next(docs)
+    assert len(doc.spans[layout.attrs.span_group]) == 4
+    # Sources should only be read ahead by a limited number
+    assert len(consumed) < 10
+    docs.close()
+
+
 def test_table(nlp):
     layout = spaCyLayout(nlp)
     doc = layout(PDF_TABLE)
@@ -139,6 +277,16 @@ def test_table_placeholder(nlp):
     assert table.text == "Table with columns: Name, Type, Place of birth"
 
 
+@pytest.mark.parametrize("separator", ["\n\n", ""])
+def test_table_empty_placeholder(separator, nlp):
+    layout = spaCyLayout(nlp, separator=separator, display_table="")
+    doc = layout(PDF_TABLE)
+    assert len(doc._.get(layout.attrs.doc_tables)) == 1
+    table = doc._.get(layout.attrs.doc_tables)[0]
+    assert table.text == ""
+    assert isinstance(table._.get(layout.attrs.span_data), DataFrame)
+
+
 @pytest.mark.parametrize(
     "box,page_height,expected",
     [
@@ -176,6 +324,22 @@ def test_bounding_box(box, page_height, expected):
     assert get_bounding_box(bbox, page_height) == expected
 
 
+def test_bounding_boxes():
+    bboxes = [
+        BoundingBox(
+            t=200.0, b=50.0, l=100.0, r=400.0, coord_origin=CoordOrigin.BOTTOMLEFT
+        ),
+        BoundingBox(
+            t=200.0, b=250.0, l=100.0, r=400.0, coord_origin=CoordOrigin.TOPLEFT
+        ),
+    ]
+    page_heights = [1000.0, 792.0]
+    result = get_bounding_boxes(bboxes, page_heights)
+    assert result.shape == (2, 4)
+    for row, bbox, page_height in zip(result.tolist(), bboxes, page_heights):
+        assert tuple(row) == get_bounding_box(bbox, page_height)
+
+
 def test_serialize_objects():
     span_layout = SpanLayout(x=10, y=20, width=30, height=40, page_no=1)
     doc_layout = DocLayout(pages=[PageLayout(page_no=1, width=500, height=600)])
@@ -191,6 +355,62 @@ def test_serialize_objects():
     assert_frame_equal(df, data["df"])
 
 
+def test_serialize_dataframe_mixed_types():
+    # Columns with mixed types can't be stored in Arrow format
+    df = DataFrame(data={"col1": ["a", 1], "col2": [3, 4]}, index=[5, 6])
+    data = srsly.msgpack_loads(srsly.msgpack_dumps({"df": df}))
+    assert_frame_equal(df, data["df"])
+
+
+@pytest.mark.parametrize(
+    "df",
+    [
+        DataFrame(data={"col1": [1, 2], "col2": ["a", "b"]}, index=[5, 6]),
+        DataFrame(data={"col1": [1, 2], "col2": ["a", "b"]}),
+        DataFrame(),
+    ],
+)
+def test_serialize_dataframe_columns(df):
+    assert isinstance(encode_df(df)[DATA_ATTR], dict)
+    data = srsly.msgpack_loads(srsly.msgpack_dumps({"df": df}))
+    assert_frame_equal(df, data["df"])
+
+
+@pytest.mark.parametrize("columns,is_arrow", [(["a", "b"], True), (["a", 0], False)])
+def test_serialize_dataframe_arrow(columns, is_arrow):
+    pytest.importorskip("pyarrow")
+    df = DataFrame(data=[[1, 2], [3, 4]], columns=columns)
+    use_arrow_tables()
+    try:
+        assert isinstance(encode_df(df)[DATA_ATTR], bytes) == is_arrow
+        data = srsly.msgpack_loads(srsly.msgpack_dumps({"df": df}))
+    finally:
+        use_arrow_tables(False)
+    assert_frame_equal(df, data["df"])
+
+
+def test_deserialize_legacy_objects():
+    span_layout = SpanLayout(x=10, y=20, width=30, height=40, page_no=1)
+    doc_layout = DocLayout(pages=[PageLayout(page_no=1, width=500, height=600)])
+    data = {
+        "span": {
+            "x": 10,
+            "y": 20,
+            "width": 30,
+            "height": 40,
+            "page_no": 1,
+            "__type__": "SpanLayout",
+        },
+        "doc": {
+            "pages": [{"page_no": 1, "width": 500, "height": 600}],
+            "__type__": "DocLayout",
+        },
+    }
+    data = srsly.msgpack_loads(srsly.msgpack_dumps(data))
+    assert data["span"] == span_layout
+    assert data["doc"] == doc_layout
+
+
 @pytest.mark.parametrize("path", [PDF_SIMPLE, PDF_TABLE])
 def test_serialize_roundtrip(path, nlp):
     layout = spaCyLayout(nlp)
@@ -213,3 +433,14 @@ def test_serialize_roundtrip(path, nlp):
         table_before = before._.get(layout.attrs.span_data)
         table_after = after._.get(layout.attrs.span_data)
         assert_frame_equal(table_before, table_after)
+
+
+def test_serialize_markdown(nlp):
+    layout = spaCyLayout(nlp)
+    doc = layout(DOCX_SIMPLE)
+    doc_bin = DocBin(store_user_data=True)
+    doc_bin.add(doc)
+    new_doc = list(DocBin().from_bytes(doc_bin.to_bytes()).get_docs(nlp.vocab))[0]
+    markdown = doc._.get(layout.attrs.doc_markdown)
+    assert markdown.startswith("Lorem ipsum dolor sit amet")
+    assert new_doc._.get(layout.attrs.doc_markdown) == markdown